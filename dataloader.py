@@ -3,12 +3,24 @@
 import logging
 import logging.config
 from os import path
+import argparse
+import glob
+import hashlib
 import json
 import importlib
-from elasticsearch import Elasticsearch
+from concurrent.futures import ThreadPoolExecutor
+from staging import StagingStore, StagingError
 
 log_file_path = path.join(path.dirname(path.abspath(__file__)), 'logging.conf')
-logging.config.fileConfig(log_file_path)
+plugin_dir = path.join(path.dirname(path.abspath(__file__)), 'plugins')
+
+
+def configure_logging():
+    """
+    Configure logging from logging.conf - deferred to run time so importing this module stays cheap
+    """
+    logging.config.fileConfig(log_file_path)
+
 
 # Custom exceptions for finer error identification
 class DataloaderFailed(Exception):
@@ -30,6 +42,59 @@ class PluginModuleNotFoundError(Exception):
 class PluginModuleClassNotFoundError(Exception):
     pass
 
+
+class PluginRegistry:
+    """
+    This class discovers plugin modules in the plugins directory without importing them. A plugin module is only
+    imported the first time its class is requested
+    """
+    def __init__(self, plugin_dir):
+        """
+        Set initial values in constructor
+        """
+        self.plugin_dir = plugin_dir
+        self.modules = {}
+        self.classes = {}
+
+    def discover(self):
+        """
+        Record each plugin_*.py module found in the plugins directory, keyed by module name
+        """
+        self.modules = {}
+        for module_path in sorted(glob.glob(path.join(self.plugin_dir, 'plugin_*.py'))):
+            self.modules[path.splitext(path.basename(module_path))[0]] = module_path
+        return self.modules
+
+    def get_module_path(self, plugin):
+        """
+        Return the path of the module implementing plugin, or None when it was not discovered
+        """
+        return self.modules.get(plugin['module'])
+
+    def get_class(self, plugin):
+        """
+        For plugin - import module on first use and return the module class that scrapes data
+        """
+        key = (plugin['module'], plugin['module_class'])
+        if key in self.classes:
+            return self.classes[key]
+
+        if plugin['module'] not in self.modules:
+            raise PluginModuleNotFoundError(None, plugin['module'])
+
+        try:
+            plugin_module = importlib.import_module("plugins." + plugin['module'])
+        except ModuleNotFoundError as e:
+            raise PluginModuleNotFoundError(None, e.args[0])
+
+        try:
+            self.classes[key] = getattr(plugin_module, plugin['module_class'])
+        except AttributeError as e:
+            raise PluginModuleClassNotFoundError(None, e.args[0])
+
+        return self.classes[key]
+
+
 class DataLoader:
     """
     This class is used to scrape API sourced data and ingest into Elasticsearch
@@ -45,16 +110,21 @@ class DataLoader:
         self.es_user_ingest = None
         self.es_user_ingest_pwd = None
         self.total_event_count = 0
+        self.registry = PluginRegistry(plugin_dir)
+        self.staging = None
+        self.chunk_size = 500
+        self.doc_type = 'doc'
 
-    def main(self):
+    def main(self, plan=False, stage_only=False):
         """
-        Entry into Dataloader called from __main__
+        Entry into Dataloader called from __main__. With plan set only the execution plan is printed, with
+        stage_only set events are written to the staging store but not indexed into ES
         """
         logging.info("Dataloader started")
 
         # Load the config driving the dataload which is persisted in JSON file, handling specific exceptions
         try:
-            dataloader.load_set_config()
+            self.load_set_config()
         except ConfigFileError as e:
             logging.debug("Configuration file error - {}".format(e.args[1]))
             raise DataloaderFailed
@@ -62,11 +132,44 @@ class DataLoader:
             logging.debug("Configuration key error with key - {}".format(e.args[1]))
             raise DataloaderFailed
 
-        # Make connection to Elasticstack (ES) cluster
-        dataloader.es_connect()
+        # Find available plugins without importing them
+        self.registry.discover()
+
+        if plan:
+            self.print_plan()
+            return
+
+        if stage_only and self.staging is None:
+            logging.debug("Staging only requested but staging is not enabled in config")
+            raise DataloaderFailed
+
+        # Without staging, each plugin scrapes data according to configured query(s) and events are indexed into ES
+        # as they arrive. Connection to the Elasticstack (ES) cluster is made while the first page of each query is
+        # fetched
+        if self.staging is None:
+            self.es_plugin_process()
+            logging.info("Total events indexed - {}".format(self.total_event_count))
+            return
 
-        # For each plugin scrape data according to configured query(s) and load into ES
-        dataloader.es_plugin_process()
+        # With staging, events are written to a segment which is sealed as soon as scraping succeeds, then bulk loaded
+        # into ES from that segment. An ES failure leaves the sealed segment for a later reindex run
+        try:
+            self.staging.open_segment('news')
+            self.es_plugin_process()
+            segment = self.staging.close_segment()
+        except StagingError as e:
+            logging.debug("Staging error - {}".format(e.args[1]))
+            raise DataloaderFailed
+        finally:
+            self.staging.close_segment(seal=False)  # No-op once sealed, otherwise left as .part so reindex ignores it
+        logging.info("Total events staged - {}".format(self.total_event_count))
+
+        if stage_only or segment is None:
+            return
+
+        self.total_event_count = 0
+        self.es_connect()
+        self.es_bulk_load([segment])
         logging.info("Total events indexed - {}".format(self.total_event_count))
 
     def load_set_config(self):
@@ -85,25 +188,49 @@ class DataLoader:
                 self.es_user_ingest_pwd = self.config['dataloader']['elasticsearch']['user_ingest_pwd']
             except KeyError as e:
                 raise ConfigKeyError(None, e.args[0])
-            else:
-                logging.info("Successfully loaded config")
+
+            # Staging is optional, only enabled when configured
+            staging = self.config['dataloader'].get('staging', {})
+            if staging.get('enabled', False):
+                try:
+                    self.staging = StagingStore(staging['path'])
+                except KeyError as e:
+                    raise ConfigKeyError(None, 'staging.' + e.args[0])
+
+            logging.info("Successfully loaded config")
 
     def get_plugin_class_instance(self, plugin):
         """
-        For plugin - dynamically load module and return instance of module class that scrapes data
+        For plugin - return instance of module class that scrapes data, importing the module on first use
         """
-        plugin_module_name = "plugins." + plugin['module']
-        try:
-            plugin_module = importlib.import_module(plugin_module_name)
-        except ModuleNotFoundError as e:
-            raise PluginModuleNotFoundError(None, e.args[0])
+        class_ = self.registry.get_class(plugin)
+        return class_(plugin['url'], plugin['api_key'])
 
+    def print_plan(self):
+        """
+        Print the plugins, queries and target indices a run would process, without any network calls
+        """
+        print("Elasticsearch cluster - {}".format(self.es_cluster))
+        if self.staging is not None:
+            print("Staging directory - {}".format(self.staging.staging_dir))
         try:
-            class_ = getattr(plugin_module, plugin['module_class'])
-        except AttributeError as e:
-            raise PluginModuleClassNotFoundError(None, e.args[0])
-
-        return class_(plugin['url'], plugin['api_key'])
+            for p in self.config['dataloader']['plugin']:
+                if not p['enabled']:
+                    print("Plugin {} - disabled, skipped".format(p['api']))
+                    continue
+
+                module_path = self.registry.get_module_path(p)
+                if module_path is None:
+                    print("Plugin {} - module {} not found, skipped".format(p['api'], p['module']))
+                    continue
+
+                print("Plugin {} - class {} in {}".format(p['api'], p['module_class'], path.relpath(module_path)))
+                for q in p['query']:
+                    print("    Query '{}' -> index {}<{}> (default {}{})".format(
+                        q, p['index_prefix'], p['index_suffix_field'], p['index_prefix'], p['index_default_suffix']))
+        except KeyError as e:
+            logging.debug("Plugin error - {}".format(e.args))
+            raise DataloaderFailed
 
     def fieldmap(self, event, cls, fieldmap):
         """
@@ -124,6 +251,8 @@ class DataLoader:
         """
         Connect to Elasticstack cluster
         """
+        from elasticsearch import Elasticsearch  # Imported here as it dominates startup time
+
         try:
             self.es = Elasticsearch([self.es_cluster], use_ssl=False, http_auth=(self.es_user_ingest,
                                                                                  self.es_user_ingest_pwd))
@@ -133,9 +262,9 @@ class DataLoader:
         else:
             logging.info("Connected to Elasticstack")
 
-    def es_index(self, event, plugin):
+    def prepare_event(self, event, plugin):
         """
-        Index a scraped event into ES
+        Apply plugin defaults to a mapped event, returning the ES index it belongs in
         """
         try:
             index = plugin['index_prefix'] + event[plugin['index_suffix_field']]
@@ -155,47 +284,134 @@ class DataLoader:
         if 'yearmonth' not in event:
             event['yearmonth'] = plugin['yearmonth_default']
 
-        # Use source id if available, else let ES determine index id
-        if 'id' in event:
-            self.es.index(index=index, doc_type='doc', id=event['id'], body=event)
-        else:
-            self.es.index(index=index, doc_type='doc', body=event)
+        # Derive a stable id when the source has none, so re-indexing or re-scraping overwrites rather than duplicates
+        if 'id' not in event:
+            event['id'] = self.event_id(event)
 
-    def es_plugin_process(self):
+        return index
+
+    @staticmethod
+    def event_id(event):
         """
-        Process each configured plugin
+        Return an id for an event derived from its publication, title and publication date
+        """
+        key = '\x1f'.join(str(event.get(field, '')) for field in ('publication', 'title', 'date_publication'))
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def es_index(self, index, event):
+        """
+        Index a scraped event into ES
+        """
+        self.es.index(index=index, doc_type=self.doc_type, id=event['id'], body=event)
+
+    def get_actions(self, segments):
         """
+        Yield bulk actions for each staged event
+        """
+        for action in self.staging.read(segments):
+            action['_type'] = self.doc_type
+            yield action
+
+    def es_bulk_load(self, segments):
+        """
+        Bulk load staged events into ES
+        """
+        # Imported here as they dominate startup time
+        from elasticsearch.helpers import bulk, BulkIndexError
+        from elasticsearch.exceptions import TransportError
+
         try:
-            for p in self.config['dataloader']['plugin']:
-                if p['enabled']:  # Only if plugin enabled
-                    logging.info("Processing started for {} plugin".format(p['api']))
+            success, errors = bulk(self.es, self.get_actions(segments), chunk_size=self.chunk_size)
+        except StagingError as e:
+            logging.debug("Staging error - {}".format(e.args[1]))
+            raise DataloaderFailed
+        except BulkIndexError as e:
+            logging.debug("Bulk index error - {} documents failed, first {}".format(len(e.errors), e.errors[:1]))
+            raise DataloaderFailed
+        except TransportError as e:
+            logging.debug("Elasticstack transport error - {}".format(e.args))
+            raise DataloaderFailed
+
+        self.total_event_count += success
+        if errors:
+            logging.info("{} documents failed to index".format(len(errors)))
+
+    def es_plugin_prefetch(self, executor):
+        """
+        Instantiate a plugin class per enabled plugin query and start fetching its first page, returning a
+        list of (plugin, query, plugin class instance, fetch future) in configured order
+        """
+        queries = []
+        for p in self.config['dataloader']['plugin']:
+            if p['enabled']:  # Only if plugin enabled
+                for q in p['query']:  # Loop plugin query list
                     try:
                         p_class = self.get_plugin_class_instance(p)  # Instantiate class handling plugin
                     except (PluginModuleNotFoundError,  PluginModuleClassNotFoundError) as e:
                         logging.debug("Skipping plugin, module/class not found - {}".format(e.args[1]))
-                        continue
-
-                    for q in p['query']:  # Loop plugin query list
-                        event_count = 0
-                        p_class.query = q
-                        for events in p_class.getDataBatch(10):
-                            for event in events:
-                                target_event = self.fieldmap(event, p_class, p['fieldmap'])  # Map source -> tgt fields
-                                self.es_index(target_event, p)  # Index event in ES
-                                event_count += 1
-                                self.total_event_count += 1
-                        logging.info("{} events scraped for query '{}'".format(event_count, q))
-                    logging.info("Processing complete for {} plugin".format(p['api']))
+                        break
+
+                    p_class.query = q
+                    queries.append((p, q, p_class, executor.submit(p_class.prefetch)))
+
+        return queries
+
+    def es_plugin_process(self):
+        """
+        Process each configured plugin
+        """
+        # Executor managed explicitly so a failed run cancels queued prefetches rather than waiting on them. Prefetches
+        # already running are not interrupted, but are bounded by the plugin request timeout
+        executor = ThreadPoolExecutor(max_workers=8)
+        try:
+            es_connected = None if self.staging is not None else executor.submit(self.es_connect)
+            queries = self.es_plugin_prefetch(executor)
+            if es_connected is not None:
+                es_connected.result()
+
+            current_plugin = None
+            for p, q, p_class, prefetched in queries:
+                if p is not current_plugin:
+                    if current_plugin is not None:
+                        logging.info("Processing complete for {} plugin".format(current_plugin['api']))
+                    logging.info("Processing started for {} plugin".format(p['api']))
+                    current_plugin = p
+
+                prefetched.result()
+                event_count = 0
+                for events in p_class.getDataBatch(10):
+                    for event in events:
+                        target_event = self.fieldmap(event, p_class, p['fieldmap'])  # Map source -> tgt fields
+                        index = self.prepare_event(target_event, p)
+                        if self.staging is not None:
+                            self.staging.append(index, target_event)  # Stage event, indexed once scraping succeeds
+                        else:
+                            self.es_index(index, target_event)  # Index event in ES
+                        event_count += 1
+                        self.total_event_count += 1
+                logging.info("{} events scraped for query '{}'".format(event_count, q))
+
+            if current_plugin is not None:
+                logging.info("Processing complete for {} plugin".format(current_plugin['api']))
 
         except KeyError as e:
             logging.debug("Plugin error - {}".format(e.args))
             raise DataloaderFailed
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Scrape news APIs and ingest into Elasticsearch")
+    parser.add_argument('--dry-run', '--plan', dest='plan', action='store_true',
+                        help="print the execution plan without any network calls")
+    parser.add_argument('--stage-only', dest='stage_only', action='store_true',
+                        help="write scraped events to the staging store without loading them into Elasticsearch")
+    args = parser.parse_args()
+    configure_logging()
     try:
         dataloader = DataLoader()
-        dataloader.main()
+        dataloader.main(plan=args.plan, stage_only=args.stage_only)
     except (DataloaderFailed, NameError, AttributeError) as e:
         logging.debug("Dataloader execution failed - {}".format(e.args))
     else:
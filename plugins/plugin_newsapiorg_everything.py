@@ -15,7 +15,11 @@ class NewsApiEverything:
         self.sep = '.'
         self.pagesize = 100
         self.pagelimit = 100  # Page limit supports testing
+        self.page = 1
         self.numpages = 0
+        self.first_page = None
+        self.first_page_query = None
+        self.timeout = 30  # Seconds, so a hung request can't stall a run
         self.statusOK = 'ok'
         self.url = url
         self.api_key = api_key
@@ -57,10 +61,18 @@ class NewsApiEverything:
             self.url, self.query, self.api_key, self.pagesize, self.page
         )
 
+    def prefetch(self):
+        """Fetch the first page and number of pages ahead of getDataBatch."""
+        self.page = 1
+        self.setNumPages()
+
     def setNumPages(self):
         url = self.getUrl()
-        response = requests.get(url)
+        response = requests.get(url, timeout=self.timeout)
         docs = response.json()
+        self.first_page = docs  # Reused by getDataBatch for the same query rather than fetched again
+        self.first_page_query = self.query
+        self.numpages = 0
         try:
             hits = docs['totalResults']
         except KeyError:
@@ -73,12 +85,17 @@ class NewsApiEverything:
     def getDataBatch(self, batch_size):
         results = []
         self.page = 1
-        self.setNumPages()
+        if self.first_page is None or self.first_page_query != self.query:
+            self.setNumPages()
+        first_page, self.first_page = self.first_page, None  # Never reused by a later call
 
         while self.page <= self.numpages:
-            url = self.getUrl()
-            response = requests.get(url)
-            docs = response.json()
+            if first_page is not None:
+                docs, first_page = first_page, None
+            else:
+                url = self.getUrl()
+                response = requests.get(url, timeout=self.timeout)
+                docs = response.json()
 
             try:
                 status = docs['status']
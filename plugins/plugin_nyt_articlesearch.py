@@ -2,6 +2,7 @@
 import logging
 import requests
 import math
+import threading
 import time
 
 log = logging.getLogger(__name__)
@@ -11,12 +12,18 @@ class NYTimesSource:
     """
     A data loader plugin for the New York Times Article Search API.
     """
+    # API limited to 1 call per second across all instances - see https://developer.nytimes.com/faq#12
+    throttle_lock = threading.Lock()
+    throttle_last_call = 0.0
 
     def __init__(self, url, api_key):
         self.sep = '.'
         self.page = 0
         self.pagelimit = 100  # Page limit supports testing
         self.numpages = 0
+        self.first_page = None
+        self.first_page_query = None
+        self.timeout = 30  # Seconds, so a hung request can't stall a run
         self.statusOK = 'OK'
         self.url = url
         self.api_key = api_key
@@ -58,10 +65,26 @@ class NYTimesSource:
             self.url, self.response_format, self.api_key, self.query, self.page
         )
 
+    def throttle(self):
+        with NYTimesSource.throttle_lock:
+            wait = NYTimesSource.throttle_last_call + 1 - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            NYTimesSource.throttle_last_call = time.monotonic()
+
+    def prefetch(self):
+        """Fetch the first page and number of pages ahead of getDataBatch."""
+        self.page = 0
+        self.setNumPages()
+
     def setNumPages(self):
+        self.throttle()
         url = self.getUrl()
-        response = requests.get(url)
+        response = requests.get(url, timeout=self.timeout)
         docs = response.json()
+        self.first_page = docs  # Reused by getDataBatch for the same query rather than fetched again
+        self.first_page_query = self.query
+        self.numpages = 0
         try:
             hits = docs['response']['meta']['hits']
         except KeyError:
@@ -74,13 +97,18 @@ class NYTimesSource:
     def getDataBatch(self, batch_size):
         results = []
         self.page = 0
-        self.setNumPages()
+        if self.first_page is None or self.first_page_query != self.query:
+            self.setNumPages()
+        first_page, self.first_page = self.first_page, None  # Never reused by a later call
 
         while self.page < self.numpages:
-            time.sleep(1)  # API limited to 1 call per second - see https://developer.nytimes.com/faq#12
-            url = self.getUrl()
-            response = requests.get(url)
-            docs = response.json()
+            if first_page is not None:
+                docs, first_page = first_page, None
+            else:
+                self.throttle()
+                url = self.getUrl()
+                response = requests.get(url, timeout=self.timeout)
+                docs = response.json()
 
             try:
                 status = docs['status']
@@ -0,0 +1,51 @@
+# Author: Jon-Paul Boyd
+# Python client bulk loading staged news events into ES, rebuilding indices without re-scraping the APIs
+import logging
+import argparse
+from dataloader import (DataLoader, DataloaderFailed, ConfigFileError, ConfigKeyError, configure_logging)
+
+
+class ReIndex(DataLoader):
+    """
+    This class is used to bulk load events from the local staging store into Elasticsearch
+    """
+    def main(self, segments=None):
+        """
+        Entry into ReIndex called from __main__. Loads the given staging segments, defaulting to all sealed segments
+        """
+        logging.info("Reindex started")
+
+        try:
+            self.load_set_config()
+        except ConfigFileError as e:
+            logging.debug("Configuration file error - {}".format(e.args[1]))
+            raise DataloaderFailed
+        except ConfigKeyError as e:
+            logging.debug("Configuration key error with key - {}".format(e.args[1]))
+            raise DataloaderFailed
+
+        if self.staging is None:
+            logging.debug("Staging is not enabled in config")
+            raise DataloaderFailed
+
+        if not segments:
+            segments = self.staging.segments()
+        logging.info("{} staging segments to load".format(len(segments)))
+
+        self.es_connect()
+        self.es_bulk_load(segments)
+        logging.info("Total events indexed - {}".format(self.total_event_count))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Bulk load staged news events into Elasticsearch")
+    parser.add_argument('segments', nargs='*', help="staging segments to load, defaults to all sealed segments")
+    args = parser.parse_args()
+    configure_logging()
+    try:
+        reindex = ReIndex()
+        reindex.main(segments=args.segments)
+    except (DataloaderFailed, NameError, AttributeError) as e:
+        logging.debug("Reindex execution failed - {}".format(e.args))
+    else:
+        logging.info("Reindex completed")
@@ -0,0 +1,106 @@
+# Author: Jon-Paul Boyd
+# Local staging store for scraped events, so scraping and indexing into ES can run independently
+import logging
+from os import path
+import os
+import glob
+import gzip
+import json
+from datetime import datetime
+
+
+# Custom exceptions for finer error identification
+class StagingError(Exception):
+    pass
+
+
+class StagingStore:
+    """
+    This class persists mapped events as gzip compressed, append-only JSONL segments. Each line holds the target
+    index, optional id and source of one event, matching the action format of an Elasticsearch bulk load
+    """
+    def __init__(self, staging_dir):
+        """
+        Set initial values in constructor
+        """
+        self.staging_dir = staging_dir
+        self.segment_suffix = '.jsonl.gz'
+        self.open_suffix = '.part'
+        self.compress_level = 6
+        self.segment_file = None
+        self.segment_path = None
+        self.segment_event_count = 0
+
+    def open_segment(self, name='segment'):
+        """
+        Start a new segment. It is written under a temporary name and only becomes visible to readers once sealed.
+        Names carry microseconds and pid, and the file is created exclusively so an existing segment is never reused
+        """
+        if self.segment_file is not None:
+            raise StagingError(None, "Segment already open - {}".format(self.segment_path))
+
+        try:
+            os.makedirs(self.staging_dir, exist_ok=True)
+        except OSError as e:
+            raise StagingError(None, "Unable to create staging directory - {}".format(e))
+
+        self.segment_path = path.join(self.staging_dir, '{}-{}-{}{}'.format(
+            name, datetime.now().strftime('%Y%m%dT%H%M%S%f'), os.getpid(), self.segment_suffix))
+        try:
+            self.segment_file = gzip.open(self.segment_path + self.open_suffix, 'xt', encoding='utf-8',
+                                          compresslevel=self.compress_level)
+        except FileExistsError:
+            raise StagingError(None, "Segment already exists - {}".format(self.segment_path))
+        self.segment_event_count = 0
+        logging.info("Staging segment opened - {}".format(self.segment_path))
+
+    def append(self, index, event):
+        """
+        Append an event destined for index to the open segment
+        """
+        action = {'_index': index, '_source': event}
+        if 'id' in event:
+            action['_id'] = event['id']
+        self.segment_file.write(json.dumps(action) + '\n')
+        self.segment_event_count += 1
+
+    def close_segment(self, seal=True):
+        """
+        Seal the open segment, returning its path, or None when it was discarded because no events were staged.
+        Without seal the segment is left as .part, keeping a failed run's events on disk but out of reach of readers
+        """
+        if self.segment_file is None:
+            return None
+
+        self.segment_file.close()
+        self.segment_file = None
+        if not self.segment_event_count:
+            os.remove(self.segment_path + self.open_suffix)
+        elif seal:
+            os.replace(self.segment_path + self.open_suffix, self.segment_path)
+            logging.info("Staging segment sealed with {} events - {}".format(self.segment_event_count,
+                                                                               self.segment_path))
+            return self.segment_path
+        else:
+            logging.info("Staging segment left unsealed with {} events - {}".format(
+                self.segment_event_count, self.segment_path + self.open_suffix))
+        return None
+
+    def segments(self):
+        """
+        Return sealed segment paths, oldest first
+        """
+        return sorted(glob.glob(path.join(self.staging_dir, '*' + self.segment_suffix)))
+
+    def read(self, segments=None):
+        """
+        Yield staged bulk actions from segments, defaulting to all sealed segments
+        """
+        for segment in segments if segments is not None else self.segments():
+            try:
+                with gzip.open(segment, 'rt', encoding='utf-8') as segment_file:
+                    for line in segment_file:
+                        if line.strip():
+                            yield json.loads(line)
+            except (OSError, EOFError, ValueError) as e:
+                raise StagingError(None, "Unreadable segment {} - {}".format(segment, e))